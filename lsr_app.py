@@ -1,21 +1,38 @@
 # lsr_app.py
 
 import os
-import shutil
+import io
+import csv
+import codecs
+import functools
 import json
 import streamlit as st
 import pandas as pd
 from datetime import date
 
-from lsr_core import normalize_and_import_csv
+from lsr_core import (
+    normalize_and_import_csv,
+    rebuild_title_keys,
+    resolve_bibliographic_columns,
+)
+
+try:
+    import orjson  # optional: faster metadata (de)serialisation
+except ImportError:
+    orjson = None
 
-import plotly.graph_objects as go
+try:
+    from pyarrow import csv as pa_csv, types as pa_types  # optional: faster CSV import
+except ImportError:
+    pa_csv = None
 
 if "show_schema_dialog" not in st.session_state:
     st.session_state.show_schema_dialog = False
 
-if "uploaded_df_temp" not in st.session_state:
-    st.session_state.uploaded_df_temp = None
+def clear_pending_upload():
+    # Release the held upload bytes as soon as the mapping step is over
+    st.session_state.show_schema_dialog = False
+    st.session_state.pop("uploaded_csv_temp", None)
 
 def get_workspace_id():
     params = st.query_params
@@ -67,7 +84,11 @@ def get_workspace_id():
 WORKSPACE_ID = get_workspace_id()
 
 PROJECT_ROOT = os.path.join("projects", WORKSPACE_ID)
-os.makedirs(PROJECT_ROOT, exist_ok=True)
+
+# Once per session (and per workspace), not on every rerun
+if st.session_state.get("project_root_ready") != PROJECT_ROOT:
+    os.makedirs(PROJECT_ROOT, exist_ok=True)
+    st.session_state.project_root_ready = PROJECT_ROOT
 
 
 # =========================
@@ -83,6 +104,16 @@ STAGES = [
 
 STAGE_STATUSES = ["Not started", "In progress", "Completed"]
 
+STATUS_ICONS = {
+    "Not started": "⚪",
+    "In progress": "🟡",
+    "Completed": "🟢"
+}
+
+# Options shown in the status table, and back to the stored value
+STATUS_LABELS = {status: f"{STATUS_ICONS[status]} {status}" for status in STAGE_STATUSES}
+STATUS_FROM_LABEL = {label: status for status, label in STATUS_LABELS.items()}
+
 # =========================
 # CSV REGISTRATION ORDER
 # =========================
@@ -93,30 +124,204 @@ STAGE_ORDER = [
     "Studies included after full-text screening"
 ]
 
+STAGE_FILES = {
+    "Search results to merge & remove duplicates": "records_deduplicated.csv",
+    "Studies included after title/abstract screening": "records_after_ta.csv",
+    "Studies included after full-text screening": "records_after_ft.csv",
+}
+
+# Placeholder entries in the column-mapping selectboxes
+SELECT_OPTION = "— Select —"
+NONE_OPTION = "— None —"
+
+# Path helpers are pure string functions of PROJECT_ROOT, which is fixed
+# for the lifetime of a script run, so memoising them is safe
+@functools.lru_cache(maxsize=256)
 def project_path(name):
     return os.path.join(PROJECT_ROOT, name)
 
+@functools.lru_cache(maxsize=256)
 def stage_data_path(project, csv_purpose):
-    mapping = {
-        "Search results to merge & remove duplicates": "records_deduplicated.csv",
-        "Studies included after title/abstract screening": "records_after_ta.csv",
-        "Studies included after full-text screening": "records_after_ft.csv",
-    }
-    return os.path.join(project_path(project), mapping[csv_purpose])
+    return os.path.join(project_path(project), STAGE_FILES[csv_purpose])
+
+# =========================
+# CACHED CSV READS (KEYED ON MTIME + SIZE)
+# =========================
+
+# Abstracts can exceed the csv module's default 128 KB field limit
+csv.field_size_limit(2**31 - 1)
+
+# Rows shown per stage in the snapshot tabs
+PREVIEW_ROWS = 50
+
+# Whole-file caches are shared by every session and each import adds a new
+# (mtime, size) key: keep roughly one entry per stage of a few open projects
+FULL_FILE_CACHE_ENTRIES = 12
+
+# lsr_core's dedup key: kept in the project CSV, but never shown, exported
+# or carried into uploaded snapshots
+INTERNAL_COLUMNS = ["title_key"]
+
+def _stat(path):
+    # One stat() call instead of separate exists/getsize/getmtime probes
+    try:
+        return os.stat(path)
+    except FileNotFoundError:
+        return None
+
+def read_csv_fast(source, encoding="utf-8"):
+    # source is a path or a seekable file object (e.g. a Streamlit upload)
+    table = None
+    if pa_csv is not None:
+        if hasattr(source, "seek"):
+            source.seek(0)
+        try:
+            # Multi-threaded Arrow reader: much faster on wide database exports
+            table = pa_csv.read_csv(
+                source,
+                read_options=pa_csv.ReadOptions(encoding=encoding),
+                # Abstracts routinely contain quoted line breaks
+                parse_options=pa_csv.ParseOptions(newlines_in_values=True),
+                convert_options=pa_csv.ConvertOptions(strings_can_be_null=True),
+            )
+        except ValueError:
+            # Malformed rows that pyarrow's stricter parser rejects
+            table = None
+
+    # pyarrow keeps undecodable text as binary and keeps blank or duplicate
+    # headers as-is; let pandas handle those so it raises / names them
+    # ("Unnamed: 1", "Year.1") exactly as the header-only read does
+    if (
+        table is not None
+        and all(table.column_names)
+        and len(set(table.column_names)) == table.num_columns
+        and not any(pa_types.is_binary(f.type) for f in table.schema)
+    ):
+        # Release each Arrow column as soon as it has been converted
+        return table.to_pandas(split_blocks=True, self_destruct=True)
+
+    if hasattr(source, "seek"):
+        source.seek(0)
+    return pd.read_csv(source, encoding=encoding)
+
+@st.cache_data(show_spinner=False)
+def _count_rows_cached(path, mtime, size):
+    # Stream rows through the csv module instead of building a DataFrame.
+    # A raw newline count would overcount abstracts with embedded line breaks.
+    with open(path, newline="", encoding="utf-8", errors="replace") as f:
+        rows = sum(1 for row in csv.reader(f) if row)
+    return max(rows - 1, 0)  # minus header
+
+@st.cache_data(show_spinner=False)
+def _read_csv_head_cached(path, mtime, size, nrows):
+    # nrows lets the C parser stop early instead of parsing the whole file
+    df = pd.read_csv(path, nrows=nrows)
+    return df.drop(columns=INTERNAL_COLUMNS, errors="ignore")
+
+@st.cache_data(max_entries=FULL_FILE_CACHE_ENTRIES, show_spinner=False)
+def _export_bytes_cached(path, mtime, size):
+    with open(path, "rb") as f:
+        data = f.read()
+
+    # Files without internal columns are already the export: serve as-is
+    header = next(csv.reader([data.split(b"\n", 1)[0].decode("utf-8", "replace")]), [])
+    if not set(INTERNAL_COLUMNS) & set(header):
+        return data
+
+    # Literal text in, literal text out: only the internal columns change
+    df = pd.read_csv(io.BytesIO(data), dtype=str, keep_default_na=False)
+    df = df.drop(columns=INTERNAL_COLUMNS, errors="ignore")
+    return df.to_csv(index=False).encode("utf-8")
 
 def count_rows(path):
-    if os.path.exists(path) and os.path.getsize(path) > 0:
-        return len(pd.read_csv(path))
+    file_stat = _stat(path)
+    if file_stat and file_stat.st_size > 0:
+        return _count_rows_cached(path, file_stat.st_mtime, file_stat.st_size)
     return 0
 
+def preview_stage(path, empty_msg, count):
+    # count comes from the dashboard's count_rows, so only stages with
+    # records are read; a stat tells an empty upload from no upload
+    file_stat = _stat(path)
+    if not file_stat or not file_stat.st_size:
+        st.info(empty_msg)
+    elif not count:
+        st.info("This stage was uploaded with no records.")
+    else:
+        df_stage = _read_csv_head_cached(
+            path, file_stat.st_mtime, file_stat.st_size, PREVIEW_ROWS
+        )
+        st.caption(f"Showing the first {len(df_stage)} of {count} records")
+        st.dataframe(df_stage, use_container_width=True)
+
+        st.download_button(
+            label="⬇ Download full CSV",
+            data=_export_bytes_cached(path, file_stat.st_mtime, file_stat.st_size),
+            file_name=os.path.basename(path),
+            mime="text/csv",
+            key=f"download_{path}"
+        )
+
+
+
+
+
+# Bytes inspected to pick an encoding before parsing an upload
+ENCODING_SNIFF_BYTES = 64 * 1024
+
+def sniff_encoding(uploaded_csv):
+    uploaded_csv.seek(0)
+    head = uploaded_csv.read(ENCODING_SNIFF_BYTES)
+    uploaded_csv.seek(0)
 
+    if head.startswith(codecs.BOM_UTF8):
+        return "utf-8-sig"
+    if head.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+        return "utf-16"
+    try:
+        # final=False tolerates a multi-byte character cut at the sample edge
+        codecs.getincrementaldecoder("utf-8")().decode(head, final=False)
+        return "utf-8"
+    except UnicodeDecodeError:
+        return "latin-1"
 
+def read_upload(data, encoding, **kwargs):
+    # kwargs (nrows, usecols, dtype, ...) go to pandas' C parser; without
+    # them the whole upload is read through read_csv_fast
+    def parse(enc):
+        if not kwargs:
+            return read_csv_fast(io.BytesIO(data), enc)
+        return pd.read_csv(io.BytesIO(data), encoding=enc, engine="c", **kwargs)
 
+    try:
+        return parse(encoding)
+    except UnicodeDecodeError:
+        # The sample decoded as UTF-8 but a later byte did not
+        return parse("latin-1")
 
+@functools.lru_cache(maxsize=256)
 def metadata_path(name):
     return os.path.join(project_path(name), "metadata.json")
 
-def build_sankey_from_counts(identified, ta, ft, de, searches):
+@functools.lru_cache(maxsize=256)
+def searches_path(name):
+    return os.path.join(project_path(name), "searches.jsonl")
+
+def database_counts(searches):
+    # Raw (pre-deduplication) records per database, as a hashable tuple
+    db_counts = {}
+    for s in searches:
+        if s.get("import_stage") == "Search results to merge & remove duplicates":
+            db = s.get("database", "Unknown")
+            db_counts[db] = db_counts.get(db, 0) + s.get("records_raw", 0)
+    return tuple(db_counts.items())
+
+# The figure only depends on these counts, so reruns reuse the same object
+@st.cache_resource(show_spinner=False)
+def build_sankey_from_counts(identified, ta, ft, de, db_counts):
+    # Plotly is slow to import; only pay for it once there is a flow to draw
+    import plotly.graph_objects as go
+
     labels = []
     source = []
     target = []
@@ -127,13 +332,7 @@ def build_sankey_from_counts(identified, ta, ft, de, searches):
     # -------------------------------
     # DATABASE SOURCES (RAW COUNTS)
     # -------------------------------
-    db_counts = {}
-    for s in searches:
-        if s.get("import_stage") == "Search results to merge & remove duplicates":
-            db = s.get("database", "Unknown")
-            db_counts[db] = db_counts.get(db, 0) + s.get("records_raw", 0)
-
-    for db in db_counts:
+    for db, _ in db_counts:
         idx[db] = len(labels)
         labels.append(db)
 
@@ -152,7 +351,7 @@ def build_sankey_from_counts(identified, ta, ft, de, searches):
     # -------------------------------
     # DATABASE → RECORDS IDENTIFIED
     # -------------------------------
-    for db, n in db_counts.items():
+    for db, n in db_counts:
         source.append(idx[db])
         target.append(idx["Records identified"])
         value.append(n)
@@ -201,36 +400,155 @@ def build_sankey_from_counts(identified, ta, ft, de, searches):
 
 
 
+# Rebuilt only when the logged searches change
+@st.cache_data(show_spinner=False)
+def search_history_table(searches):
+    # Built column by column: one list per column, no per-row dicts
+    return pd.DataFrame({
+        "Stage": [s.get("import_stage") for s in searches],
+        "Database": [s.get("database") for s in searches],
+        "Date": [s.get("run_date") for s in searches],
+        "Coverage": [
+            f"{s.get('search_start_year')}–{s.get('search_end_year')}"
+            for s in searches
+        ],
+        "Records identified": [s.get("records_raw") for s in searches],
+        "Search query (verbatim)": [s.get("search_strategy") for s in searches],
+    })
+
+# Only re-formatted when the saved study identification changes
+@st.cache_data(show_spinner=False)
+def study_identification_text(current_data, version_num, last_updated):
+    text = f"""Study Identification & Review Framing
+=================================
+
+Working review title:
+{current_data.get("title", "")}
+
+Primary research question:
+{current_data.get("research_question", "")}
+
+Population:
+{current_data.get("population", "")}
+
+Intervention / Exposure:
+{current_data.get("intervention", "")}
+
+Comparator:
+{current_data.get("comparator", "")}
+
+Outcome(s):
+{current_data.get("outcomes", "")}
+
+Study designs included:
+{current_data.get("study_designs", "")}
+
+---------------------------------
+Inclusion criteria:
+{current_data.get("inclusion", "")}
+
+---------------------------------
+Exclusion criteria:
+{current_data.get("exclusion", "")}
+
+---------------------------------
+Notes / rationale:
+{current_data.get("notes", "")}
+
+---------------------------------
+Version: v{version_num}
+Last updated: {last_updated}
+"""
+    # Encoded once here rather than by download_button on every render
+    return text.encode("utf-8")
+
+
 # =========================
 # METADATA HELPERS
 # =========================
 
+@st.cache_data(show_spinner=False)
+def _load_metadata_cached(path, mtime):
+    with open(path, "rb") as f:
+        raw = f.read()
+    return orjson.loads(raw) if orjson else json.loads(raw)
+
 def load_metadata(project):
+    # st.cache_data hands back a copy, so callers may mutate the result freely
     path = metadata_path(project)
-    if os.path.exists(path):
-        with open(path, "r", encoding="utf-8") as f:
-            return json.load(f)
+    file_stat = _stat(path)
+    if file_stat:
+        return _load_metadata_cached(path, file_stat.st_mtime)
     return {}
 
 def save_metadata(project, data):
-    with open(metadata_path(project), "w", encoding="utf-8") as f:
-        json.dump(data, f, indent=2)
+    path = metadata_path(project)
+    if orjson:
+        payload = orjson.dumps(data)
+    else:
+        payload = json.dumps(data, separators=(",", ":")).encode("utf-8")
+
+    # Write a temp file and swap it in, so an interrupted rerun can never
+    # leave a truncated metadata.json behind
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(payload)
+    os.replace(tmp_path, path)
+    # Don't rely on mtime alone: coarse filesystem clocks can miss a rewrite
+    _load_metadata_cached.clear()
+
+# -------------------------
+# Search log: one JSON object per line, appended on each import
+# -------------------------
+
+def _search_line(record):
+    if orjson:
+        return orjson.dumps(record) + b"\n"
+    return (json.dumps(record, separators=(",", ":")) + "\n").encode("utf-8")
+
+@st.cache_data(show_spinner=False)
+def _load_searches_cached(path, mtime, size):
+    loads = orjson.loads if orjson else json.loads
+    with open(path, "rb") as f:
+        return [loads(line) for line in f if line.strip()]
+
+def load_searches(project):
+    # Appends always grow the file, so size keeps the key fresh even when
+    # the mtime doesn't tick
+    path = searches_path(project)
+    file_stat = _stat(path)
+    if file_stat:
+        return _load_searches_cached(path, file_stat.st_mtime, file_stat.st_size)
+    return []
+
+def append_search(project, record):
+    # Logging an import writes one line; earlier searches are never rewritten
+    with open(searches_path(project), "ab") as f:
+        f.write(_search_line(record))
+
+@st.cache_data(ttl=5, show_spinner=False)
+def _list_project_dirs(root):
+    # DirEntry.is_dir() reuses the type info from the scan: no stat per entry
+    with os.scandir(root) as entries:
+        return sorted(e.name for e in entries if e.is_dir())
 
 def list_projects():
-    return sorted(
-        p for p in os.listdir(PROJECT_ROOT)
-        if os.path.isdir(os.path.join(PROJECT_ROOT, p))
-    )
+    return _list_project_dirs(PROJECT_ROOT)
 
 def delete_project(project):
+    import shutil
+
     shutil.rmtree(project_path(project), ignore_errors=True)
+    _list_project_dirs.clear()
 
 # =========================
 # CSV MIGRATION HELPER
 # =========================
 
 def load_project_csv_with_migration(csv_file):
-    df = pd.read_csv(csv_file)
+    # Literal strings, so the rewrite only renames: "NA" stays a title and
+    # 2020 doesn't become 2020.0
+    df = pd.read_csv(csv_file, dtype=str, keep_default_na=False)
 
     # Backward compatibility: search_round → search_id
     if "search_id" not in df.columns and "search_round" in df.columns:
@@ -239,6 +557,246 @@ def load_project_csv_with_migration(csv_file):
 
     return df
 
+# Bump when adding a migration step below
+METADATA_SCHEMA_VERSION = 3
+
+def migrate_project(project, metadata):
+    # Runs each step once per project; afterwards the version marker lets
+    # reruns skip the file checks entirely. Returns True if metadata changed.
+    version = metadata.get("schema_version", 0)
+    if version >= METADATA_SCHEMA_VERSION:
+        return False
+
+    if version < 1:
+        dedup_csv = stage_data_path(project, "Search results to merge & remove duplicates")
+        file_stat = _stat(dedup_csv)
+        if file_stat and file_stat.st_size > 0:
+            load_project_csv_with_migration(dedup_csv)
+
+    if version < 2:
+        # Search log moved out of metadata.json into searches.jsonl
+        searches = metadata.pop("searches", [])
+        path = searches_path(project)
+        # Skip if an interrupted earlier run already wrote the log
+        if searches and _stat(path) is None:
+            tmp_path = path + ".tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(b"".join(_search_line(s) for s in searches))
+            os.replace(tmp_path, path)
+
+    if version < 3:
+        # Dedup keys now ignore punctuation and spacing: re-key old records
+        dedup_csv = stage_data_path(project, "Search results to merge & remove duplicates")
+        file_stat = _stat(dedup_csv)
+        if file_stat and file_stat.st_size > 0:
+            rebuild_title_keys(dedup_csv)
+
+    metadata["schema_version"] = METADATA_SCHEMA_VERSION
+    return True
+
+# =========================
+# PAGE FRAGMENTS
+# =========================
+
+# Fragments rerun on their own when their widgets are used, so editing a
+# stage status doesn't re-render the rest of the page. They reload
+# metadata themselves because their arguments are frozen from the last
+# full run.
+
+def _save_status_edits(project, key):
+    # Apply only the rows the user just changed, on top of the statuses as
+    # saved now, then rotate the editor key so the next run starts clean
+    metadata = load_metadata(project)
+    for row, changes in st.session_state[key]["edited_rows"].items():
+        label = changes.get("Status")
+        if label in STATUS_FROM_LABEL:
+            metadata["stage_status"][STAGES[int(row)]] = STATUS_FROM_LABEL[label]
+    save_metadata(project, metadata)
+    st.session_state[f"stage_status_rev_{project}"] += 1
+
+@st.fragment
+def render_stage_status(project, counts):
+    metadata = load_metadata(project)
+    statuses = [STATUS_LABELS[metadata["stage_status"][stage]] for stage in STAGES]
+
+    # One editable table instead of a column layout and a button per stage.
+    # Each save bumps the revision, so the editor never carries old edits
+    # into a run and replays them over statuses changed since.
+    revision = st.session_state.setdefault(f"stage_status_rev_{project}", 0)
+    key = f"stage_status_{project}_{revision}"
+    st.data_editor(
+        pd.DataFrame({
+            "Stage": STAGES,
+            "Records": [counts.get(stage, 0) for stage in STAGES],
+            "Status": statuses,
+        }),
+        column_config={
+            "Status": st.column_config.SelectboxColumn(
+                "Status",
+                options=list(STATUS_LABELS.values()),
+                required=True
+            ),
+        },
+        disabled=["Stage", "Records"],
+        hide_index=True,
+        use_container_width=True,
+        key=key,
+        on_change=_save_status_edits,
+        args=(project, key)
+    )
+
+
+@st.fragment
+def render_stage_previews(project, stage_counts):
+    tab1, tab2, tab3 = st.tabs([
+        "After deduplication",
+        "After title/abstract screening",
+        "After full-text screening"
+    ])
+
+    with tab1:
+        preview_stage(
+            stage_data_path(project, "Search results to merge & remove duplicates"),
+            "No deduplicated records uploaded yet.",
+            stage_counts["Search results to merge & remove duplicates"]
+        )
+
+    with tab2:
+        preview_stage(
+            stage_data_path(project, "Studies included after title/abstract screening"),
+            "No title/abstract screening results uploaded yet.",
+            stage_counts["Studies included after title/abstract screening"]
+        )
+
+    with tab3:
+        preview_stage(
+            stage_data_path(project, "Studies included after full-text screening"),
+            "No full-text screening results uploaded yet.",
+            stage_counts["Studies included after full-text screening"]
+        )
+
+
+@st.fragment
+def render_study_identification(project):
+    # Edits here only rerun this editor; saving reruns the whole page so the
+    # status table picks up the auto-updated stage status
+    metadata = load_metadata(project)
+
+    study_id = metadata.setdefault("study_identification", {})
+    history = study_id.setdefault("history", [])
+    current = study_id.setdefault("current", {})
+
+    with st.expander(
+        "Edit study identification (living document)",
+        expanded=False
+    ):
+
+        title = st.text_input(
+            "Working review title",
+            value=current.get("title", "")
+        )
+
+        research_question = st.text_area(
+            "Primary research question",
+            value=current.get("research_question", ""),
+            height=80
+        )
+
+        population = st.text_input(
+            "Population",
+            value=current.get("population", "")
+        )
+
+        intervention = st.text_input(
+            "Intervention / Exposure",
+            value=current.get("intervention", "")
+        )
+
+        comparator = st.text_input(
+            "Comparator (if applicable)",
+            value=current.get("comparator", "")
+        )
+
+        outcomes = st.text_input(
+            "Outcome(s)",
+            value=current.get("outcomes", "")
+        )
+
+        study_designs = st.text_input(
+            "Study designs included",
+            value=current.get("study_designs", "")
+        )
+
+        inclusion = st.text_area(
+            "Inclusion criteria",
+            value=current.get("inclusion", ""),
+            height=120
+        )
+
+        exclusion = st.text_area(
+            "Exclusion criteria",
+            value=current.get("exclusion", ""),
+            height=120
+        )
+
+        notes = st.text_area(
+            "Notes / rationale (optional)",
+            value=current.get("notes", ""),
+            height=100
+        )
+
+        # ---- Buttons row (INSIDE expander) ----
+        col_save, col_download = st.columns([1, 1])
+
+        with col_save:
+            if st.button("💾 Save new version"):
+                new_version = len(history) + 1
+                snapshot = {
+                    "version": new_version,
+                    "saved_at": date.today().isoformat(),
+                    "data": {
+                        "title": title,
+                        "research_question": research_question,
+                        "population": population,
+                        "intervention": intervention,
+                        "comparator": comparator,
+                        "outcomes": outcomes,
+                        "study_designs": study_designs,
+                        "inclusion": inclusion,
+                        "exclusion": exclusion,
+                        "notes": notes,
+                    }
+                }
+
+                history.append(snapshot)
+                study_id["current"] = snapshot["data"]
+
+                # Auto-update Study identification status on first save
+                if metadata["stage_status"].get("Study identification") == "Not started":
+                    metadata["stage_status"]["Study identification"] = "In progress"
+
+                save_metadata(project, metadata)
+                st.success(f"Saved version v{new_version}")
+                st.rerun()
+
+        with col_download:
+            if study_id.get("current"):
+                current_data = study_id["current"]
+                version_num = len(history)
+                last_updated = history[-1]["saved_at"]
+
+                export_txt = study_identification_text(
+                    current_data, version_num, last_updated
+                )
+
+                st.download_button(
+                    label="⬇ Download (TXT)",
+                    data=export_txt,
+                    file_name=f"{project}_study_identification_v{version_num}.txt",
+                    mime="text/plain"
+                )
+
+
 # =========================
 # STREAMLIT SETUP
 # =========================
@@ -280,15 +838,24 @@ projects = list_projects()
 if "current_project" not in st.session_state:
     st.session_state.current_project = None
 
-for p in projects:
-    col1, col2 = st.sidebar.columns([0.85, 0.15])
-    if col1.button(p, key=f"open_{p}"):
-        st.session_state.current_project = p
-        st.rerun()
-    if col2.button("🗑", key=f"delete_{p}"):
-        delete_project(p)
-        if st.session_state.current_project == p:
-            st.session_state.current_project = None
+# One selectbox + one delete button instead of two widgets per project
+if projects:
+    current = st.session_state.current_project
+    selected = st.sidebar.selectbox(
+        "Open project",
+        projects,
+        index=projects.index(current) if current in projects else None,
+        placeholder="Select a project"
+    )
+
+    if selected != current:
+        st.session_state.current_project = selected
+        clear_pending_upload()
+
+    if selected and st.sidebar.button("🗑 Delete selected project"):
+        delete_project(selected)
+        st.session_state.current_project = None
+        clear_pending_upload()
         st.rerun()
 
 st.sidebar.divider()
@@ -300,8 +867,12 @@ new_project = st.sidebar.text_input(
 
 if st.sidebar.button("Create project"):
     if new_project.strip():
-        os.makedirs(project_path(new_project), exist_ok=True)
+        # An existing name just opens that project
+        if new_project not in projects:
+            os.makedirs(project_path(new_project), exist_ok=True)
+            _list_project_dirs.clear()
         st.session_state.current_project = new_project
+        clear_pending_upload()
         st.rerun()
 
 # =========================
@@ -319,14 +890,22 @@ st.subheader(f"📂 Project: `{project}`")
 # Load + initialize metadata (MUST COME FIRST)
 # -------------------------
 
-
+# Loaded once per rerun; the sections below share this dict
 metadata = load_metadata(project)
 
-metadata.setdefault("stage_status", {})
-for stage in STAGES:
-    metadata["stage_status"].setdefault(stage, "Not started")
+metadata_changed = migrate_project(project, metadata)
+
+if any(stage not in metadata.get("stage_status", {}) for stage in STAGES):
+    metadata.setdefault("stage_status", {})
+    for stage in STAGES:
+        metadata["stage_status"].setdefault(stage, "Not started")
+    metadata_changed = True
 
-save_metadata(project, metadata)
+# Only write back when something was actually migrated or defaulted
+if metadata_changed:
+    save_metadata(project, metadata)
+
+searches = load_searches(project)
 
 # =========================
 # PROJECT PROGRESS DASHBOARD
@@ -334,85 +913,37 @@ save_metadata(project, metadata)
 
 st.subheader("📊 Project Status")
 
-# ---- Load + initialize metadata ----
-metadata = load_metadata(project)
-metadata.setdefault("stage_status", {})
-
-for stage in STAGES:
-    metadata["stage_status"].setdefault(stage, "Not started")
-
-save_metadata(project, metadata)
-
 base_path = project_path(project)
 
 # =========================
 # PROJECT PROGRESS DASHBOARD (PRISMA-CORRECT)
 # =========================
 
-metadata = load_metadata(project)
-
 # Study identification = total records identified (WITH duplicates)
 study_identification_count = sum(
     s.get("records_raw", 0)
-    for s in metadata.get("searches", [])
+    for s in searches
     if s.get("import_stage") == "Search results to merge & remove duplicates"
 )
 
 
 
+# Rows in each registered stage file
+stage_counts = {
+    purpose: count_rows(stage_data_path(project, purpose))
+    for purpose in STAGE_ORDER
+}
+
 counts = {
     "Study identification": study_identification_count,
-    "Title/abstract screening": count_rows(
-        stage_data_path(project, "Search results to merge & remove duplicates")
-    ),
-    "Full-text screening": count_rows(
-        stage_data_path(project, "Studies included after title/abstract screening")
-    ),
-    "Data extraction": count_rows(
-        stage_data_path(project, "Studies included after full-text screening")
-    ),
+    "Title/abstract screening": stage_counts["Search results to merge & remove duplicates"],
+    "Full-text screening": stage_counts["Studies included after title/abstract screening"],
+    "Data extraction": stage_counts["Studies included after full-text screening"],
 }
 
 
 
-# ---- Table header ----
-col_stage, col_records, col_status = st.columns([3, 1.2, 4])
-with col_stage:
-    st.markdown("**Stage**")
-with col_records:
-    st.markdown("**Records**")
-with col_status:
-    st.markdown("**Status**")
-
-# ---- Table rows ----
-for stage in STAGES:
-    col_stage, col_records, col_status = st.columns([3, 1.2, 4])
-
-    with col_stage:
-        st.markdown(stage)
-
-    with col_records:
-        st.markdown(str(counts.get(stage, 0)))
-
-    with col_status:
-        status = metadata["stage_status"][stage]
-
-        status_icon = {
-            "Not started": "⚪",
-            "In progress": "🟡",
-            "Completed": "🟢"
-        }[status]
-
-        if st.button(f"{status_icon} {status}", key=f"status_{stage}"):
-            next_status = {
-                "Not started": "In progress",
-                "In progress": "Completed",
-                "Completed": "Not started"
-            }[status]
-
-            metadata["stage_status"][stage] = next_status
-            save_metadata(project, metadata)
-            st.rerun()
+render_stage_status(project, counts)
 
 
 # =========================
@@ -421,158 +952,7 @@ for stage in STAGES:
 
 st.subheader("📘 Study Identification")
 
-metadata = load_metadata(project)
-study_id = metadata.setdefault("study_identification", {})
-history = study_id.setdefault("history", [])
-current = study_id.setdefault("current", {})
-
-with st.expander(
-    "Edit study identification (living document)",
-    expanded=False
-):
-
-    title = st.text_input(
-        "Working review title",
-        value=current.get("title", "")
-    )
-
-    research_question = st.text_area(
-        "Primary research question",
-        value=current.get("research_question", ""),
-        height=80
-    )
-
-    population = st.text_input(
-        "Population",
-        value=current.get("population", "")
-    )
-
-    intervention = st.text_input(
-        "Intervention / Exposure",
-        value=current.get("intervention", "")
-    )
-
-    comparator = st.text_input(
-        "Comparator (if applicable)",
-        value=current.get("comparator", "")
-    )
-
-    outcomes = st.text_input(
-        "Outcome(s)",
-        value=current.get("outcomes", "")
-    )
-
-    study_designs = st.text_input(
-        "Study designs included",
-        value=current.get("study_designs", "")
-    )
-
-    inclusion = st.text_area(
-        "Inclusion criteria",
-        value=current.get("inclusion", ""),
-        height=120
-    )
-
-    exclusion = st.text_area(
-        "Exclusion criteria",
-        value=current.get("exclusion", ""),
-        height=120
-    )
-
-    notes = st.text_area(
-        "Notes / rationale (optional)",
-        value=current.get("notes", ""),
-        height=100
-    )
-
-    # ---- Buttons row (INSIDE expander) ----
-    col_save, col_download = st.columns([1, 1])
-
-    with col_save:
-        if st.button("💾 Save new version"):
-            new_version = len(history) + 1
-            snapshot = {
-                "version": new_version,
-                "saved_at": date.today().isoformat(),
-                "data": {
-                    "title": title,
-                    "research_question": research_question,
-                    "population": population,
-                    "intervention": intervention,
-                    "comparator": comparator,
-                    "outcomes": outcomes,
-                    "study_designs": study_designs,
-                    "inclusion": inclusion,
-                    "exclusion": exclusion,
-                    "notes": notes,
-                }
-            }
-
-            history.append(snapshot)
-            study_id["current"] = snapshot["data"]
-
-            # Auto-update Study identification status on first save
-            if metadata["stage_status"].get("Study identification") == "Not started":
-                metadata["stage_status"]["Study identification"] = "In progress"
-
-            save_metadata(project, metadata)
-            st.success(f"Saved version v{new_version}")
-            st.rerun()
-
-    with col_download:
-        if study_id.get("current"):
-            current_data = study_id["current"]
-            version_num = len(history)
-            last_updated = history[-1]["saved_at"]
-
-            export_text = f"""Study Identification & Review Framing
-=================================
-
-Working review title:
-{current_data.get("title", "")}
-
-Primary research question:
-{current_data.get("research_question", "")}
-
-Population:
-{current_data.get("population", "")}
-
-Intervention / Exposure:
-{current_data.get("intervention", "")}
-
-Comparator:
-{current_data.get("comparator", "")}
-
-Outcome(s):
-{current_data.get("outcomes", "")}
-
-Study designs included:
-{current_data.get("study_designs", "")}
-
----------------------------------
-Inclusion criteria:
-{current_data.get("inclusion", "")}
-
----------------------------------
-Exclusion criteria:
-{current_data.get("exclusion", "")}
-
----------------------------------
-Notes / rationale:
-{current_data.get("notes", "")}
-
----------------------------------
-Version: v{version_num}
-Last updated: {last_updated}
-"""
-
-            st.download_button(
-                label="⬇ Download (TXT)",
-                data=export_text,
-                file_name=f"{project}_study_identification_v{version_num}.txt",
-                mime="text/plain"
-            )
-
+render_study_identification(project)
 
 # =========================
 # SEARCH DOCUMENTATION
@@ -645,51 +1025,57 @@ with st.expander("Register reference search", expanded=False):
                 st.error("Search query is required for search result uploads.")
                 st.stop()
 
-        try:
-            uploaded_csv.seek(0)
-            df_upload = pd.read_csv(uploaded_csv, encoding="utf-8")
-        except UnicodeDecodeError:
-            uploaded_csv.seek(0)
-            df_upload = pd.read_csv(uploaded_csv, encoding="latin-1")
+        # Keep the raw bytes and read only the header for the mapping step;
+        # the records are parsed once the columns are known
+        encoding = sniff_encoding(uploaded_csv)
+        data = uploaded_csv.getvalue()
+        header = read_upload(data, encoding, nrows=0)
 
-        st.session_state.uploaded_df_temp = df_upload
+        st.session_state.uploaded_csv_temp = (data, encoding, list(header.columns))
         st.session_state.show_schema_dialog = True
 
-    if st.session_state.show_schema_dialog and st.session_state.uploaded_df_temp is not None:
+        # Pre-select the columns whose names match a known alias; this also
+        # replaces any selection left over from a previous upload
+        detected = resolve_bibliographic_columns(header)
+        st.session_state.map_title = detected["title"] or SELECT_OPTION
+        st.session_state.map_authors = NONE_OPTION
+        for field in ("journal", "year", "abstract"):
+            st.session_state[f"map_{field}"] = detected[field] or NONE_OPTION
+
+    if st.session_state.show_schema_dialog and "uploaded_csv_temp" in st.session_state:
 
         st.markdown("---")
         st.subheader("🧩 Map CSV columns to standardized fields")
 
-        df_upload = st.session_state.uploaded_df_temp
-        all_columns = list(df_upload.columns)
+        upload_data, upload_encoding, all_columns = st.session_state.uploaded_csv_temp
 
         title_col = st.selectbox(
             "Title (required)",
-            options=["— Select —"] + all_columns,
+            options=[SELECT_OPTION] + all_columns,
             key="map_title"
         )
 
         authors_col = st.selectbox(
             "Author(s)",
-            options=["— None —"] + all_columns,
+            options=[NONE_OPTION] + all_columns,
             key="map_authors"
         )
 
         journal_col = st.selectbox(
             "Journal / Source",
-            options=["— None —"] + all_columns,
+            options=[NONE_OPTION] + all_columns,
             key="map_journal"
         )
 
         year_col = st.selectbox(
             "Publication year",
-            options=["— None —"] + all_columns,
+            options=[NONE_OPTION] + all_columns,
             key="map_year"
         )
 
         abstract_col = st.selectbox(
             "Abstract",
-            options=["— None —"] + all_columns,
+            options=[NONE_OPTION] + all_columns,
             key="map_abstract"
         )
 
@@ -703,35 +1089,47 @@ with st.expander("Register reference search", expanded=False):
         with col_confirm:
             if st.button("✅ Confirm & Import", key="confirm_import"):
 
-                if title_col == "— Select —":
+                if title_col == SELECT_OPTION:
                     st.error("A title column is required.")
                     st.stop()
 
-                def clean(x):
-                    return None if x.startswith("—") else x
-
-
                 rename = {title_col: "title"}
 
-                if clean(authors_col):
+                if authors_col != NONE_OPTION:
                     rename[authors_col] = "authors"
 
-                if clean(journal_col):
+                if journal_col != NONE_OPTION:
                     rename[journal_col] = "journal"
 
-                if clean(year_col):
+                if year_col != NONE_OPTION:
                     rename[year_col] = "year"
 
-                if clean(abstract_col):
+                if abstract_col != NONE_OPTION:
                     rename[abstract_col] = "abstract"
 
+                custom_fields = [x.strip() for x in custom_fields_raw.split(",") if x.strip()]
+
+                if is_db_search_stage:
+                    # Only the mapped fields are stored, so skip the other columns
+                    wanted = set(rename) | set(custom_fields)
+                    usecols = [i for i, c in enumerate(all_columns) if c in wanted]
+                    df_upload = read_upload(
+                        upload_data, upload_encoding, usecols=usecols, dtype=str
+                    )
+                else:
+                    # TA / FT snapshots keep every column of the export
+                    df_upload = read_upload(upload_data, upload_encoding)
+
+                # A re-uploaded export may still carry the dedup key
+                df_upload = df_upload.drop(columns=INTERNAL_COLUMNS, errors="ignore")
+
                 df_std = df_upload.rename(columns=rename)
 
                 for col in ["authors", "journal", "year", "abstract"]:
                     if col not in df_std.columns:
                         df_std[col] = None
 
-                for c in [x.strip() for x in custom_fields_raw.split(",") if x.strip()]:
+                for c in custom_fields:
                     if c not in df_std.columns:
                         df_std[c] = None
 
@@ -748,13 +1146,14 @@ with st.expander("Register reference search", expanded=False):
                     prev_stage = STAGE_ORDER[current_stage_index - 1]
                     prev_path = stage_data_path(project, prev_stage)
 
-                    if not os.path.exists(prev_path):
+                    if _stat(prev_path) is None:
                         st.error(
                             f"You must first register a CSV for: '{prev_stage}'."
                         )
                         st.stop()
 
-                    prev_count = count_rows(prev_path)
+                    # Counted from the same file at the top of this rerun
+                    prev_count = stage_counts[prev_stage]
 
                     if current_count > prev_count:
                         st.error(
@@ -769,12 +1168,13 @@ with st.expander("Register reference search", expanded=False):
                 # =========================
 
                 raw_count = len(df_std)  # ALWAYS defined
+                stage_csv = stage_data_path(project, csv_purpose)
 
-                if csv_purpose == "Search results to merge & remove duplicates":
+                if is_db_search_stage:
                     # Deduplicate
                     added, search_id = normalize_and_import_csv(
                         uploaded_df=df_std,
-                        project_csv=stage_data_path(project, csv_purpose),
+                        project_csv=stage_csv,
                         database_name=database_name,
                         search_start_year=search_start_year,
                         search_end_year=search_end_year,
@@ -783,13 +1183,12 @@ with st.expander("Register reference search", expanded=False):
 
                 else:
                     # TA / FT snapshots (no deduplication)
-                    stage_csv = stage_data_path(project, csv_purpose)
                     df_std.to_csv(stage_csv, index=False)
                     added = raw_count
                     search_id = None
                     dedup_count = None
 
-                metadata.setdefault("searches", []).append({
+                append_search(project, {
                     "search_id": search_id,
                     "database": database_name if is_db_search_stage else None,
                     "search_strategy": search_strategy if is_db_search_stage else None,
@@ -804,17 +1203,13 @@ with st.expander("Register reference search", expanded=False):
                     "import_stage": csv_purpose,
                 })
 
-                save_metadata(project, metadata)
-
-                st.session_state.show_schema_dialog = False
-                st.session_state.uploaded_df_temp = None
+                clear_pending_upload()
                 st.success(f"Imported {added} records.")
                 st.rerun()
 
         with col_cancel:
             if st.button("❌ Cancel", key="cancel_import"):
-                st.session_state.show_schema_dialog = False
-                st.session_state.uploaded_df_temp = None
+                clear_pending_upload()
                 st.rerun()
 
 
@@ -824,25 +1219,10 @@ with st.expander("Register reference search", expanded=False):
 
 st.subheader("📜 Reference Search History")
 
-searches = metadata.get("searches", [])
-
 if not searches:
     st.info("No searches documented yet.")
 else:
-    # Convert search history to a table-friendly format
-    history_rows = []
-
-    for s in searches:
-        history_rows.append({
-            "Stage": s.get("import_stage"),
-            "Database": s.get("database"),
-            "Date": s.get("run_date"),
-            "Coverage": f"{s.get('search_start_year')}–{s.get('search_end_year')}",
-            "Records identified": s.get("records_raw"),
-            "Search query (verbatim)": s.get("search_strategy"),
-        })
-
-    df_history = pd.DataFrame(history_rows)
+    df_history = search_history_table(searches)
 
     st.dataframe(
         df_history,
@@ -856,40 +1236,19 @@ else:
 
 st.subheader("📈 Study Flow Overview")
 
-# Total records identified across all searches
-dedup_path = stage_data_path(project, "Search results to merge & remove duplicates")
-ta_path = stage_data_path(project, "Studies included after title/abstract screening")
-ft_path = stage_data_path(project, "Studies included after full-text screening")
-
 # =========================
 # STUDY FLOW OVERVIEW (PRISMA-CORRECT)
 # =========================
 
-metadata = load_metadata(project)
-
 # Records identified (WITH duplicates, across databases)
-identified = sum(
-    s.get("records_raw", 0)
-    for s in metadata.get("searches", [])
-    if s.get("import_stage") == "Search results to merge & remove duplicates"
-)
-
-
-# After deduplication
-ta_count = count_rows(
-    stage_data_path(project, "Search results to merge & remove duplicates")
-)
-
-# After title/abstract screening
-ft_count = count_rows(
-    stage_data_path(project, "Studies included after title/abstract screening")
-)
-
-# After full-text screening / data extraction
-de_count = count_rows(
-    stage_data_path(project, "Studies included after full-text screening")
-)
+# (same total as the Project Status row above)
+identified = study_identification_count
 
+# Stage sizes come from the stage_counts computed for the dashboard:
+# after deduplication, after title/abstract and after full-text screening
+ta_count = stage_counts["Search results to merge & remove duplicates"]
+ft_count = stage_counts["Studies included after title/abstract screening"]
+de_count = stage_counts["Studies included after full-text screening"]
 
 
 if identified > 0:
@@ -898,7 +1257,7 @@ if identified > 0:
         ta=ta_count,
         ft=ft_count,
         de=de_count,
-        searches=metadata.get("searches", []),
+        db_counts=database_counts(searches),
     )
     st.plotly_chart(fig, use_container_width=True, theme=None)
 else:
@@ -910,29 +1269,4 @@ else:
 
 st.subheader("🗐 Record snapshots by stage")
 
-tab1, tab2, tab3 = st.tabs([
-    "After deduplication",
-    "After title/abstract screening",
-    "After full-text screening"
-])
-
-with tab1:
-    path = stage_data_path(project, "Search results to merge & remove duplicates")
-    if os.path.exists(path):
-        st.dataframe(pd.read_csv(path), use_container_width=True)
-    else:
-        st.info("No deduplicated records uploaded yet.")
-
-with tab2:
-    path = stage_data_path(project, "Studies included after title/abstract screening")
-    if os.path.exists(path):
-        st.dataframe(pd.read_csv(path), use_container_width=True)
-    else:
-        st.info("No title/abstract screening results uploaded yet.")
-
-with tab3:
-    path = stage_data_path(project, "Studies included after full-text screening")
-    if os.path.exists(path):
-        st.dataframe(pd.read_csv(path), use_container_width=True)
-    else:
-        st.info("No full-text screening results uploaded yet.")
+render_stage_previews(project, stage_counts)
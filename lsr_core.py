@@ -1,45 +1,64 @@
 # lsr_core.py
 
 import os
+import functools
 import pandas as pd
 from datetime import date
 
 
+# Strips spaces and underscores in a single str.translate pass
+_COLNAME_STRIP = str.maketrans("", "", " _")
+
+
 def normalize_colname(col):
-    return col.lower().replace(" ", "").replace("_", "")
+    return col.lower().translate(_COLNAME_STRIP)
 
 
+# Immutable: built once at import, shared by every lookup
 COLUMN_ALIASES = {
-    "title": {
+    "title": frozenset({
         "title", "articletitle", "documenttitle",
         "publicationtitle", "itemtitle", "ti"
-    },
-    "abstract": {
+    }),
+    "abstract": frozenset({
         "abstract", "abstracttext", "abstractnote",
         "summary", "description", "ab"
-    },
-    "journal": {
+    }),
+    "journal": frozenset({
         "journal", "journal/book", "source", "sourcetitle",
         "publicationname", "containertitle", "so"
-    },
-    "year": {
+    }),
+    "year": frozenset({
         "year", "publicationyear", "py", "date", "issued"
-    }
+    })
 }
 
 
-def resolve_bibliographic_columns(df):
-    normalized = {normalize_colname(c): c for c in df.columns}
-    resolved = {}
+# Inverted once at import: normalized alias -> canonical field
+ALIAS_TO_FIELD = {
+    alias: canonical
+    for canonical, aliases in COLUMN_ALIASES.items()
+    for alias in aliases
+}
 
-    for canonical, aliases in COLUMN_ALIASES.items():
-        resolved[canonical] = next(
-            (normalized[a] for a in aliases if a in normalized),
-            None
-        )
+
+@functools.lru_cache(maxsize=128)
+def _resolve_columns(columns):
+    # One pass, one dict probe per column; the first matching column wins
+    resolved = dict.fromkeys(COLUMN_ALIASES)
+
+    for col in columns:
+        canonical = ALIAS_TO_FIELD.get(normalize_colname(col))
+        if canonical and resolved[canonical] is None:
+            resolved[canonical] = col
 
     return resolved
 
+
+def resolve_bibliographic_columns(df):
+    # Memoised on the column names; copy so callers can't mutate the cache
+    return dict(_resolve_columns(tuple(df.columns)))
+
 # =========================
 # CANONICAL CSV SCHEMA
 # =========================
@@ -55,12 +74,28 @@ FINAL_COLUMNS = [
     "search_start_year",
     "search_end_year",
     "run_date",
+    "title_key",
 ]
 
 # =========================
 # UPDATE / APPEND RECORDS
 # =========================
 
+def _title_keys(titles):
+    # Dedup key: 64-bit hash of the title reduced to lower-case letters and
+    # digits, so case, spacing and punctuation ("COVID-19: a review." vs
+    # "Covid 19 - a review") don't hide a duplicate
+    raw = titles.astype("string").str.strip().str.lower()
+    folded = raw.str.replace(r"[\W_]+", "", regex=True)
+
+    # Titles with no letters or digits ("???") are keyed on their raw form
+    folded = folded.mask(folded.fillna("").eq(""), raw)
+
+    keys = pd.util.hash_pandas_object(folded, index=False).astype("UInt64")
+    # Missing or blank titles get no key
+    return keys.mask(raw.fillna("").eq(""))
+
+
 def update_lsr_database(
     records,
     project_csv,
@@ -70,53 +105,97 @@ def update_lsr_database(
     run_date = date.today().isoformat()
 
     # ---------- LOAD EXISTING ----------
-    if os.path.exists(project_csv) and os.path.getsize(project_csv) > 0:
-        df_old = pd.read_csv(project_csv)
-
-        # Backward compatibility
-        if "search_id" not in df_old.columns and "search_round" in df_old.columns:
-            df_old = df_old.rename(columns={"search_round": "search_id"})
-
-        next_search_id = int(df_old["search_id"].max()) + 1
-        existing_titles = set(
-            df_old["title"].astype(str).str.lower().str.strip().dropna()
-        )
+    # One stat() call covers both "missing" and "empty"
+    try:
+        csv_size = os.stat(project_csv).st_size
+    except FileNotFoundError:
+        csv_size = 0
+
+    if csv_size > 0:
+        # Only a file already in the canonical layout can be appended to
+        header = pd.read_csv(project_csv, nrows=0)
+        appendable = list(header.columns) == FINAL_COLUMNS
+
+        if appendable:
+            # Appending needs just the next id and the stored title keys;
+            # no title strings are parsed or normalised
+            df_old = pd.read_csv(
+                project_csv,
+                usecols=["title_key", "search_id"],
+                dtype={"title_key": "UInt64"},
+            )
+            existing_titles = df_old["title_key"].dropna()
+        else:
+            # Read every value as its literal text, so the rewrite below
+            # doesn't turn "NA" titles into blanks or 2020 into 2020.0
+            df_old = pd.read_csv(project_csv, dtype=str, keep_default_na=False)
+
+            # Backward compatibility
+            if "search_id" not in df_old.columns and "search_round" in df_old.columns:
+                df_old = df_old.rename(columns={"search_round": "search_id"})
+
+            # Older files have no (or stale) keys: recompute, and the rewrite
+            # below stores them
+            df_old["title_key"] = _title_keys(df_old["title"])
+            existing_titles = df_old["title_key"].dropna()
+
+        next_search_id = int(pd.to_numeric(df_old["search_id"]).max()) + 1
     else:
         df_old = pd.DataFrame(columns=FINAL_COLUMNS)
         next_search_id = 1
-        existing_titles = set()
-
-    new_rows = []
-
-    for r in records:
-        title = str(r.get("title", "")).strip()
-        if not title:
-            continue
-
-        if title.lower() in existing_titles:
-            continue
-
-        new_rows.append({
-            "database": r.get("database"),
-            "title": title,
-            "journal": r.get("journal"),
-            "year": r.get("year"),
-            "abstract": r.get("abstract"),
-            "abstract_source": r.get("abstract_source", "csv_import"),
-            "search_id": next_search_id,
-            "search_start_year": search_start_year,
-            "search_end_year": search_end_year,
-            "run_date": run_date,
-        })
-
-    if new_rows:
-        df_new = pd.DataFrame(new_rows, columns=FINAL_COLUMNS)
-        df_all = pd.concat([df_old, df_new], ignore_index=True)
+        existing_titles = pd.Series(dtype="UInt64")
+        appendable = False
+
+    # ---------- FILTER NEW RECORDS ----------
+    # records: a DataFrame or an iterable of dicts; filtered column-wise
+    df_new = pd.DataFrame(records).reindex(
+        columns=["database", "title", "journal", "year", "abstract", "abstract_source"]
+    )
+
+    df_new["title"] = df_new["title"].astype("string").str.strip()
+    df_new["abstract_source"] = df_new["abstract_source"].fillna("csv_import")
+    df_new["title_key"] = _title_keys(df_new["title"])
+
+    # Skip blank titles and titles already in the project file
+    keep = (
+        df_new["title"].fillna("").ne("")
+        & ~df_new["title_key"].isin(existing_titles)
+    )
+
+    df_new = df_new.loc[keep].assign(
+        search_id=next_search_id,
+        search_start_year=search_start_year,
+        search_end_year=search_end_year,
+        run_date=run_date,
+    )[FINAL_COLUMNS]
+
+    if appendable:
+        # Write only this search's rows instead of rewriting every earlier one
+        if len(df_new):
+            df_new.to_csv(project_csv, mode="a", header=False, index=False)
     else:
-        df_all = df_old
+        # New file, or a legacy/non-canonical layout: write the whole table
+        if len(df_new):
+            df_all = pd.concat([df_old, df_new], ignore_index=True)
+        else:
+            df_all = df_old
+
+        # Canonical columns first, so the next import can append
+        extra = [c for c in df_all.columns if c not in FINAL_COLUMNS]
+        df_all = df_all.reindex(columns=FINAL_COLUMNS + extra)
+        df_all.to_csv(project_csv, index=False)
+
+    return len(df_new), next_search_id
+
 
-    df_all.to_csv(project_csv, index=False)
-    return len(new_rows), next_search_id
+def rebuild_title_keys(project_csv):
+    # Recompute every stored key, e.g. after _title_keys changes. Values are
+    # read as literal text so the rewrite changes nothing but title_key.
+    df = pd.read_csv(project_csv, dtype=str, keep_default_na=False)
+    df["title_key"] = _title_keys(df["title"])
+
+    extra = [c for c in df.columns if c not in FINAL_COLUMNS]
+    df.reindex(columns=FINAL_COLUMNS + extra).to_csv(project_csv, index=False)
 
 
 # =========================
@@ -130,17 +209,18 @@ def normalize_and_import_csv(
     search_start_year,
     search_end_year,
 ):
-    records = []
-
-    for _, row in uploaded_df.iterrows():
-        records.append({
+    # Built column-wise from the mapped upload; no per-row iteration
+    records = pd.DataFrame(
+        {
             "database": database_name,
-            "title": row.get("title"),
-            "journal": row.get("journal"),
-            "year": row.get("year"),
-            "abstract": row.get("abstract"),
+            "title": uploaded_df.get("title"),
+            "journal": uploaded_df.get("journal"),
+            "year": uploaded_df.get("year"),
+            "abstract": uploaded_df.get("abstract"),
             "abstract_source": "csv_import",
-        })
+        },
+        index=uploaded_df.index,
+    )
 
     return update_lsr_database(
         records=records,